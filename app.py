@@ -1,14 +1,19 @@
 import os
 import json
 import time
+import random
 import threading
+import queue
+import sqlite3
 import sys
+import itertools
+from collections import OrderedDict, deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError
+from http.client import HTTPSConnection, HTTPException, RemoteDisconnected
 from urllib.parse import urlencode, parse_qs, urlparse
-from flask import Flask, redirect, request, render_template, jsonify, session, url_for
+import orjson
+from flask import Flask, Response, redirect, request, render_template, jsonify, session, url_for
 from uuid import uuid4
 
 # Force unbuffered output for Railway logs
@@ -33,6 +38,11 @@ class ReverseProxied:
 
 app.wsgi_app = ReverseProxied(app.wsgi_app)
 
+
+def _json(obj) -> Response:
+    """jsonify mais barato para respostas grandes (log do job, lista de canais)."""
+    return app.response_class(orjson.dumps(obj), mimetype="application/json")
+
 # ─── Basic Auth ───────────────────────────────────────────────────────────────
 
 BASIC_AUTH_USER = os.environ.get("BASIC_AUTH_USER", "nuke")
@@ -65,6 +75,8 @@ SLACK_CLIENT_ID = os.environ.get("SLACK_CLIENT_ID", "")
 SLACK_CLIENT_SECRET = os.environ.get("SLACK_CLIENT_SECRET", "")
 SLACK_API_BASE = "https://slack.com/api"
 
+CONVERSATION_TYPES = ["public_channel", "private_channel", "mpim", "im"]
+
 USER_SCOPES = ",".join([
     "channels:history",
     "channels:read",
@@ -78,50 +90,536 @@ USER_SCOPES = ",".join([
     "users:read",
 ])
 
-# ─── In-memory job tracking ──────────────────────────────────────────────────
+# ─── Job tracking ────────────────────────────────────────────────────────────
+
+class StreamLimitReached(Exception):
+    """Limite de streams SSE abertos atingido (o cliente volta ao polling)."""
+
+
+class JobStore:
+    """Jobs de purge em memória (um RLock por job), gravados opcionalmente em SQLite."""
+
+    def __init__(self, db_path: str = None):
+        self._d = {}
+        self._lock = threading.Lock()
+        self._subscribers = {}  # job_id -> set de queue.Queue dos streams SSE
+        self._dirty = set()
+        self._touched = {}  # job_id -> time.time() da última alteração
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                             "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL DEFAULT 0)")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            if "updated_at" not in columns:
+                # jobs.db criado antes da retenção: contar a idade a partir de agora
+                with self._db:
+                    self._db.execute("ALTER TABLE jobs ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+                    self._db.execute("UPDATE jobs SET updated_at = ?", (time.time(),))
+            self.prune()
+            self._load()
+        threading.Thread(target=self._maintenance_loop, daemon=True).start()
+
+    def add(self, job_id: str, job: dict) -> dict:
+        job["id"] = job_id
+        job["lock"] = threading.RLock()
+        with self._lock:
+            self._d[job_id] = job
+            self._dirty.add(job_id)
+            self._touched[job_id] = time.time()
+        return job
+
+    def touch(self, job: dict):
+        """Marca o job para ser gravado no próximo flush."""
+        with self._lock:
+            self._dirty.add(job["id"])
+            self._touched[job["id"]] = time.time()
+
+    def subscribe(self, job_id: str, last_log: int):
+        """Registra um stream do log; retorna (fila, últimas entradas) ou None."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        q = queue.Queue(maxsize=LOG_MAX_ENTRIES)
+        # Backlog e registro sob o lock do job: nenhuma entrada se perde ou repete
+        with job["lock"]:
+            log = job["log"]
+            backlog = list(itertools.islice(log, max(0, len(log) - last_log), None))
+            with self._lock:
+                subs = self._subscribers.setdefault(job_id, set())
+                # Cada stream prende uma thread do gunicorn
+                total = sum(len(s) for s in self._subscribers.values())
+                if len(subs) >= SSE_MAX_STREAMS_PER_JOB or total >= SSE_MAX_STREAMS:
+                    if not subs:
+                        del self._subscribers[job_id]
+                    raise StreamLimitReached(job_id)
+                subs.add(q)
+        return q, backlog
+
+    def unsubscribe(self, job_id: str, q: queue.Queue):
+        with self._lock:
+            subs = self._subscribers.get(job_id)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self._subscribers[job_id]
+
+    def publish(self, job: dict, entry: dict):
+        """Entrega uma entrada de log aos streams abertos (chamar sob job["lock"])."""
+        with self._lock:
+            subs = list(self._subscribers.get(job["id"], ()))
+        for q in subs:
+            try:
+                q.put_nowait(entry)
+            except queue.Full:
+                pass  # cliente lento: perde entradas em vez de travar o job
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            return self._d.get(job_id)
+
+    def snapshot(self, job_id: str, last_log: int = None) -> dict:
+        """Cópia consistente do job, com as últimas `last_log` entradas do log."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        return self._copy(job, last_log)
+
+    def snapshots(self) -> list:
+        """Lista de (job_id, cópia do job) sem o log."""
+        with self._lock:
+            jobs = list(self._d.items())
+        return [(job_id, self._copy(job)) for job_id, job in jobs]
+
+    @staticmethod
+    def _copy(job: dict, last_log: int = None) -> dict:
+        with job["lock"]:
+            snap = {k: v for k, v in job.items() if k not in ("lock", "log")}
+            if last_log is not None:
+                log = job["log"]
+                snap["log"] = list(itertools.islice(log, max(0, len(log) - last_log), None))
+        return snap
+
+    def _load(self):
+        for job_id, data, updated_at in self._db.execute("SELECT id, data, updated_at FROM jobs"):
+            job = json.loads(data)
+            self._touched[job_id] = updated_at
+            job["log"] = deque(job.get("log", []), maxlen=LOG_MAX_ENTRIES)
+            if job["status"] in ("running", "pending"):
+                # A thread que rodava o job morreu junto com o processo anterior
+                job["status"] = "error"
+                job["log"].append({
+                    "time": datetime.now().strftime("%H:%M:%S"),
+                    "message": "💥 Job interrompido por reinício do servidor",
+                })
+                self._dirty.add(job_id)
+                self._touched[job_id] = time.time()
+            job["lock"] = threading.RLock()
+            self._d[job_id] = job
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            jobs = [(job_id, job) for job_id, job in self._d.items()
+                    if job_id in dirty or job["status"] == "running"]
+        now = time.time()
+        rows = []
+        for job_id, job in jobs:
+            snap = self._copy(job, LOG_MAX_ENTRIES)
+            rows.append((job_id, json.dumps(snap, ensure_ascii=False), now))
+        if rows:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO jobs (id, data, updated_at) VALUES (?, ?, ?)", rows)
+
+    def prune(self):
+        """Apaga jobs finalizados sem alteração há mais de JOBS_RETENTION_DAYS."""
+        if not JOBS_RETENTION_DAYS:
+            return
+        cutoff = time.time() - JOBS_RETENTION_DAYS * 86400
+        with self._lock:
+            expired = [job_id for job_id, job in self._d.items()
+                       if job["status"] not in ("running", "pending")
+                       and self._touched.get(job_id, 0) < cutoff]
+            for job_id in expired:
+                del self._d[job_id]
+                self._touched.pop(job_id, None)
+                self._dirty.discard(job_id)
+        if self._db:
+            with self._db:
+                self._db.execute("DELETE FROM jobs WHERE updated_at < ? AND "
+                                 "json_extract(data, '$.status') NOT IN ('running', 'pending')",
+                                 (cutoff,))
+
+    def _maintenance_loop(self):
+        last_prune = time.time()
+        while True:
+            time.sleep(JOBS_FLUSH_INTERVAL)
+            try:
+                if self._db:
+                    self.flush()
+                if time.time() - last_prune >= JOBS_PRUNE_INTERVAL:
+                    last_prune = time.time()
+                    self.prune()
+            except sqlite3.Error as e:
+                print(f"[JOBS] Falha ao gravar jobs: {e}")
 
-purge_jobs = {}  # job_id -> { status, progress, total, deleted, errors, log, ... }
 
-RATE_LIMIT_DELETE = 0      # Zero delay - let retry handle 429
 RATE_LIMIT_FETCH = 0       # Zero delay
 BATCH_SIZE = 1000          # Mais mensagens por request
 PARALLEL_DELETES = 20      # Deletar 20 mensagens em paralelo
 PARALLEL_FETCH = 30        # Buscar 30 conversas em paralelo
+REQUEST_TIMEOUT = 15       # Timeout de cada chamada à API (segundos)
+BACKOFF_BASE = 1           # Espera mínima entre tentativas (segundos)
+BACKOFF_CAP = 60           # Espera máxima entre tentativas (segundos)
+LOG_MAX_ENTRIES = 500      # Manter últimas 500 entradas do log de cada job
+JOBS_FLUSH_INTERVAL = 1    # Gravar jobs alterados no SQLite a cada 1s
+JOBS_PRUNE_INTERVAL = 3600 # Aplicar a retenção de jobs a cada 1h
+DRY_RUN_SAMPLES = 20       # Mensagens de exemplo (data/ts, sem texto) no log do dry run
+SSE_KEEPALIVE = 5          # Keepalive no stream do log a cada 5s (detecta cliente que saiu)
+SSE_MAX_STREAMS = 4        # Streams de log abertos no processo (gunicorn tem 8 threads)
+SSE_MAX_STREAMS_PER_JOB = 2
+
+# Arquivo SQLite dos jobs; vazio = só em memória
+JOBS_DB = os.environ.get("JOBS_DB", "jobs.db")
+# Dias que um job finalizado fica guardado; 0 = para sempre
+JOBS_RETENTION_DAYS = float(os.environ.get("JOBS_RETENTION_DAYS", 7))
+
+purge_jobs = JobStore(JOBS_DB)  # job_id -> { status, progress, total, deleted, errors, log, lock, ... }
+
+# Ids de job/batch: horário do boot (jobs antigos continuam no SQLite) seguido
+# de um contador monotônico do processo
+_JOB_ID_PREFIX = f"{int(time.time()):x}"
+_job_counter = itertools.count(1)
+_job_counter_lock = threading.Lock()
+
+
+def new_job_id() -> str:
+    with _job_counter_lock:
+        n = next(_job_counter)
+    return f"{_JOB_ID_PREFIX}{n:04x}"
+
+# Subtipos de mensagem que não são conteúdo do usuário e não devem ser deletados
+SKIP_SUBTYPES = frozenset({
+    "channel_join",
+    "channel_leave",
+    "channel_topic",
+    "channel_purpose",
+    "bot_message",
+})
+
+
+# ─── Rate limit ──────────────────────────────────────────────────────────────
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate` chamadas/segundo, rajadas de até `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserva o token já (pode ficar negativo) e dorme fora do lock
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+    @property
+    def last_used(self) -> float:
+        """time.monotonic() do último acquire (ou da criação)."""
+        return self._updated
+
+
+# Limites dos tiers da Web API do Slack: (chamadas/segundo, rajada). O Slack
+# conta por método e por workspace, então cada (token, método) tem o próprio
+# bucket; o tier só escolhe o ritmo
+TIER_LIMITS = {
+    "tier2": (20 / 60, 20),
+    "tier3": (50 / 60, 50),
+    "tier4": (100 / 60, 100),
+}
+
+METHOD_TIERS = {
+    "conversations.list": "tier2",
+    "users.list": "tier2",
+    "conversations.history": "tier3",
+    "conversations.replies": "tier3",
+    "chat.delete": "tier3",
+    "users.info": "tier4",
+}
+
+BUCKET_IDLE_TTL = 3600     # Descartar buckets sem uso há 1h (tokens de sessões antigas)
+
+_buckets = {}  # (token, method) -> TokenBucket
+_buckets_lock = threading.Lock()
+
+
+def tier_of(method: str) -> str:
+    """Tier do método, ou None para métodos sem limite conhecido (ex.: oauth)."""
+    return METHOD_TIERS.get(method)
+
+
+def bucket_for(token: str, method: str) -> TokenBucket:
+    """Bucket do par (token, método), ou None se o método não tem tier."""
+    tier = tier_of(method)
+    if tier is None:
+        return None
+    key = (token, method)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            now = time.monotonic()
+            for k in [k for k, b in _buckets.items() if now - b.last_used > BUCKET_IDLE_TTL]:
+                del _buckets[k]
+            bucket = _buckets[key] = TokenBucket(*TIER_LIMITS[tier])
+    return bucket
 
 
 # ─── Slack API Helper ────────────────────────────────────────────────────────
 
-def slack_request(method: str, token: str, params: dict = None, retries: int = 3) -> dict:
-    url = f"{SLACK_API_BASE}/{method}"
+# Uma conexão HTTPS keep-alive por thread: evita pagar TCP + TLS a cada
+# chamada (http.client não é thread-safe, então não dá para compartilhar uma só)
+_SLACK_URL = urlparse(SLACK_API_BASE)
+_http_local = threading.local()
+
+
+def _slack_connection() -> HTTPSConnection:
+    conn = getattr(_http_local, "conn", None)
+    if conn is None:
+        conn = HTTPSConnection(_SLACK_URL.netloc, timeout=REQUEST_TIMEOUT)
+        _http_local.conn = conn
+    return conn
+
+
+def _drop_slack_connection():
+    conn = getattr(_http_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _http_local.conn = None
+
+
+def slack_request(method: str, token: str, params: dict = None, retries: int = 8,
+                  job: dict = None) -> dict:
+    path = f"{_SLACK_URL.path}/{method}"
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/x-www-form-urlencoded",
     }
-    data = urlencode(params).encode("utf-8") if params else None
-    req = Request(url, data=data, headers=headers, method="POST")
+    body = urlencode(params) if params else ""
 
+    # Backoff exponencial com "decorrelated jitter": cada espera é sorteada
+    # entre a base e 3x a espera anterior, limitada a BACKOFF_CAP
+    bucket = bucket_for(token, method)
+    delay = BACKOFF_BASE
     for attempt in range(retries):
+        retry_after = 0
+        if bucket:
+            bucket.acquire()
+        conn = _slack_connection()
+        reused = conn.sock is not None
         try:
-            with urlopen(req) as resp:
-                result = json.loads(resp.read().decode("utf-8"))
-                if not result.get("ok"):
-                    error = result.get("error", "unknown")
-                    if error == "ratelimited":
-                        retry_after = int(resp.headers.get("Retry-After", 30))
-                        time.sleep(retry_after)
-                        continue
-                    return {"ok": False, "error": error}
-                return result
-        except HTTPError as e:
-            if e.code == 429:
-                retry_after = int(e.headers.get("Retry-After", 30))
-                time.sleep(retry_after)
+            conn.request("POST", path, body=body, headers=headers)
+            resp = conn.getresponse()
+            payload = resp.read()
+        except (HTTPException, OSError) as e:
+            _drop_slack_connection()
+            if reused and isinstance(e, (RemoteDisconnected, ConnectionError)):
+                # Slack fechou a conexão ociosa: reconectar sem esperar
                 continue
-            return {"ok": False, "error": str(e)}
+            reason = str(e) or type(e).__name__
+        else:
+            if resp.status == 429:
+                retry_after = int(resp.getheader("Retry-After", 0))
+                reason = "HTTP 429"
+            elif resp.status >= 500:
+                reason = f"HTTP {resp.status}"
+            elif resp.status >= 400:
+                return {"ok": False, "error": f"HTTP Error {resp.status}: {resp.reason}"}
+            else:
+                result = json.loads(payload.decode("utf-8"))
+                if result.get("ok"):
+                    return result
+                error = result.get("error", "unknown")
+                if error != "ratelimited":
+                    # attempts: o chamador sabe se uma tentativa anterior pode ter sido aplicada
+                    return {"ok": False, "error": error, "attempts": attempt + 1}
+                retry_after = int(resp.getheader("Retry-After", 0))
+                reason = "ratelimited"
+
+        if attempt == retries - 1:
+            break
+        delay = min(BACKOFF_CAP, random.uniform(BACKOFF_BASE, delay * 3))
+        wait = max(retry_after, delay)
+        message = f"⏸️ {method}: {reason}, tentativa {attempt + 2}/{retries} em {wait:.1f}s"
+        if job is not None:
+            add_log(job, message)
+        else:
+            print(f"[RETRY] {message}")
+        time.sleep(wait)
 
     return {"ok": False, "error": "max_retries"}
 
 
+# ─── Cache de chamadas à API ─────────────────────────────────────────────────
+#
+# Perfis de usuário e listas de conversas mudam pouco, então ficam em cache
+# por processo. Uma entrada vencida há menos de um TTL extra ainda é
+# devolvida na hora enquanto uma thread de fundo busca o valor novo
+# (stale-while-revalidate); mais velha que isso (ou com allow_stale=False),
+# é recarregada na hora.
+
+CACHE_TTL_USERS = int(os.environ.get("CACHE_TTL_USERS", 86400))
+CACHE_TTL_CONVS = int(os.environ.get("CACHE_TTL_CONVS", 600))
+
+_user_cache = {}   # (token, user_id) -> (buscado_em, user)
+_conv_cache = {}   # (token, ch_type) -> (buscado_em, channels)
+_user_map_cache = {}  # (token,) -> (buscado_em, {user_id: nome})
+_cache_lock = threading.Lock()
+_refresh_queue = queue.Queue()
+_refreshing = set()  # (id(cache), key) com refresh já enfileirado
+
+
+def _cache_get(cache: dict, key: tuple, ttl: int, loader, allow_stale: bool = True):
+    with _cache_lock:
+        entry = cache.get(key)
+    if entry:
+        fetched_at, value = entry
+        age = time.time() - fetched_at
+        if age < ttl:
+            return value
+        if allow_stale and age < 2 * ttl:
+            _schedule_refresh(cache, key, ttl, loader)
+            return value
+
+    value = loader()
+    if value is not None:
+        _cache_put(cache, key, ttl, value)
+        return value
+    # Slack falhou: melhor a entrada vencida do que nada
+    return entry[1] if entry else None
+
+
+def _cache_put(cache: dict, key: tuple, ttl: int, value):
+    now = time.time()
+    with _cache_lock:
+        cache[key] = (now, value)
+        # Entradas além de 2x TTL nunca mais são servidas: descartar (e o token junto)
+        for k in [k for k, (fetched_at, _) in cache.items() if now - fetched_at >= 2 * ttl]:
+            del cache[k]
+
+
+def _schedule_refresh(cache: dict, key: tuple, ttl: int, loader):
+    with _cache_lock:
+        if (id(cache), key) in _refreshing:
+            return
+        _refreshing.add((id(cache), key))
+    _refresh_queue.put((cache, key, ttl, loader))
+
+
+def _refresh_worker():
+    while True:
+        cache, key, ttl, loader = _refresh_queue.get()
+        try:
+            value = loader()
+            if value is not None:
+                _cache_put(cache, key, ttl, value)
+        except Exception as e:
+            print(f"[CACHE] Falha ao atualizar {key[1:]}: {e}")
+        finally:
+            with _cache_lock:
+                _refreshing.discard((id(cache), key))
+
+
+threading.Thread(target=_refresh_worker, daemon=True).start()
+
+
+def cached_users_info(token: str, user_id: str) -> dict:
+    """Retorna o objeto user do users.info (ou None se a chamada falhar)."""
+    def load():
+        result = slack_request("users.info", token, {"user": user_id})
+        return result["user"] if result.get("ok") else None
+    return _cache_get(_user_cache, (token, user_id), CACHE_TTL_USERS, load)
+
+
+def _build_user_map(token: str) -> dict:
+    """Pagina o users.list e monta {user_id: nome} (ou None se a chamada falhar)."""
+    user_map = {}
+    cursor = None
+    while True:
+        params = {"limit": 1000}
+        if cursor:
+            params["cursor"] = cursor
+        result = slack_request("users.list", token, params)
+        if not result.get("ok"):
+            return None
+        for user in result.get("members", []):
+            user_map[user["id"]] = user.get("real_name", user.get("name", user["id"]))
+        cursor = result.get("response_metadata", {}).get("next_cursor")
+        if not cursor:
+            return user_map
+
+
+def cached_user_map(token: str) -> dict:
+    user_map = _cache_get(_user_map_cache, (token,), CACHE_TTL_USERS,
+                          lambda: _build_user_map(token))
+    return user_map or {}
+
+
+def _list_conversations(token: str, ch_type: str, job: dict = None) -> tuple:
+    """Pagina o conversations.list de um tipo; retorna (channels, erro ou None)."""
+    channels = []
+    cursor = None
+    while True:
+        params = {"types": ch_type, "limit": 200}
+        if cursor:
+            params["cursor"] = cursor
+        result = slack_request("conversations.list", token, params, job=job)
+        if not result.get("ok"):
+            # Devolver as páginas já buscadas junto com o erro
+            return channels, result.get("error", "unknown")
+        channels.extend(result.get("channels", []))
+        cursor = result.get("response_metadata", {}).get("next_cursor")
+        if not cursor:
+            return channels, None
+
+
+def cached_conversations_list(token: str, ch_type: str, job: dict = None,
+                              allow_stale: bool = True) -> tuple:
+    """Retorna (channels, erro ou None); lista incompleta não entra no cache."""
+    failure = {}
+
+    def load():
+        channels, error = _list_conversations(token, ch_type, job)
+        if error:
+            failure["channels"], failure["error"] = channels, error
+            return None
+        return channels
+
+    channels = _cache_get(_conv_cache, (token, ch_type), CACHE_TTL_CONVS, load, allow_stale)
+    if channels is None:
+        channels = failure.get("channels", [])
+    return channels, failure.get("error")
+
+
+def list_all_conversations(token: str, job: dict = None, allow_stale: bool = True) -> list:
+    """Lista os 4 tipos de conversa em paralelo; retorna [(ch_type, channels, erro)]."""
+    with ThreadPoolExecutor(max_workers=len(CONVERSATION_TYPES)) as executor:
+        futures = [executor.submit(cached_conversations_list, token, ch_type, job, allow_stale)
+                   for ch_type in CONVERSATION_TYPES]
+        # Coletar na ordem original dos tipos
+        return [(ch_type, *f.result()) for ch_type, f in zip(CONVERSATION_TYPES, futures)]
+
+
 def date_to_ts(date_str: str, end_of_day: bool = False) -> str:
     dt = datetime.strptime(date_str, "%Y-%m-%d")
     if end_of_day:
@@ -162,12 +660,69 @@ def split_date_range_monthly(start_str: str, end_str: str) -> list:
     return chunks
 
 
+# ─── Sessão ───────────────────────────────────────────────────────────────────
+#
+# O cookie da sessão leva só token, user id e um "sid"; nome e avatar ficam no
+# servidor, para não trafegar a cada poll do dashboard. Sessões que terminam
+# fechando o navegador nunca passam pelo logout, então o mapa é um LRU
+# limitado; um registro descartado é refeito a partir do token da sessão.
+
+USER_RECORDS_MAX = 1000
+
+_user_records = OrderedDict()  # sid -> { id, name, avatar }, mais recente no fim
+_user_records_lock = threading.Lock()
+
+
+def _get_user_record(sid: str) -> dict:
+    with _user_records_lock:
+        user = _user_records.get(sid)
+        if user is not None:
+            _user_records.move_to_end(sid)
+        return user
+
+
+def _set_user_record(sid: str, user: dict):
+    with _user_records_lock:
+        _user_records[sid] = user
+        _user_records.move_to_end(sid)
+        while len(_user_records) > USER_RECORDS_MAX:
+            _user_records.popitem(last=False)
+
+
+def build_user_record(token: str, user_id: str) -> dict:
+    user_info = cached_users_info(token, user_id)
+    user_name = "Usuário"
+    user_avatar = ""
+    if user_info:
+        profile = user_info.get("profile", {})
+        user_name = profile.get("real_name", user_info.get("name", "Usuário"))
+        user_avatar = profile.get("image_72", "")
+    return {
+        "id": user_id,
+        "name": user_name,
+        "avatar": user_avatar,
+    }
+
+
+def current_user() -> dict:
+    """Registro do usuário logado (ou None se não houver sessão do Slack)."""
+    sid = session.get("sid")
+    user = _get_user_record(sid) if sid else None
+    if user is None and session.get("slack_token"):
+        # Processo reiniciou ou registro saiu do LRU: refazer a partir do token
+        user = build_user_record(session["slack_token"], session.get("slack_user_id", ""))
+        if not sid:
+            sid = session["sid"] = uuid4().hex
+        _set_user_record(sid, user)
+    return user
+
+
 # ─── OAuth Routes ─────────────────────────────────────────────────────────────
 
 @app.route("/")
 @requires_auth
 def index():
-    user = session.get("slack_user")
+    user = current_user()
     return render_template("index.html", user=user, client_id=SLACK_CLIENT_ID)
 
 
@@ -211,12 +766,13 @@ def auth_callback():
     base_url = request.url_root.rstrip("/")
     redirect_uri = f"{base_url}/auth/callback"
 
+    # Sem retry: o code só vale uma vez e a 2ª tentativa esconderia o erro real
     result = slack_request("oauth.v2.access", "", {
         "client_id": SLACK_CLIENT_ID,
         "client_secret": SLACK_CLIENT_SECRET,
         "code": code,
         "redirect_uri": redirect_uri,
-    })
+    }, retries=1)
 
     if not result.get("ok"):
         return render_template("error.html",
@@ -230,29 +786,20 @@ def auth_callback():
     if not user_token:
         return render_template("error.html", message="Token de usuário não retornado"), 400
 
-    # Buscar info do usuário
-    user_info = slack_request("users.info", user_token, {"user": user_id})
-    user_name = "Usuário"
-    user_avatar = ""
-    if user_info.get("ok"):
-        profile = user_info["user"].get("profile", {})
-        user_name = profile.get("real_name", user_info["user"].get("name", "Usuário"))
-        user_avatar = profile.get("image_72", "")
-
-    # Salvar na sessão
+    # Salvar na sessão (perfil fica no servidor)
+    sid = uuid4().hex
+    _set_user_record(sid, build_user_record(user_token, user_id))
+    session["sid"] = sid
     session["slack_token"] = user_token
     session["slack_user_id"] = user_id
-    session["slack_user"] = {
-        "id": user_id,
-        "name": user_name,
-        "avatar": user_avatar,
-    }
 
     return redirect(url_for("dashboard"))
 
 
 @app.route("/auth/logout")
 def logout():
+    with _user_records_lock:
+        _user_records.pop(session.get("sid"), None)
     session.clear()
     return redirect(url_for("index"))
 
@@ -262,7 +809,7 @@ def logout():
 @app.route("/dashboard")
 @requires_auth
 def dashboard():
-    user = session.get("slack_user")
+    user = current_user()
     if not user:
         return redirect(url_for("index"))
     return render_template("dashboard.html", user=user)
@@ -285,43 +832,34 @@ def api_conversations():
         "im": "dm",
     }
 
-    for ch_type in ["public_channel", "private_channel", "mpim", "im"]:
-        cursor = None
-        while True:
-            params = {"types": ch_type, "limit": 200}
-            if cursor:
-                params["cursor"] = cursor
-
-            result = slack_request("conversations.list", token, params)
-            if not result.get("ok"):
-                break
-
-            for ch in result.get("channels", []):
-                name = ch.get("name")
-                if not name:
-                    # DM: resolver nome do usuário
-                    dm_user_id = ch.get("user", "")
-                    if dm_user_id:
-                        user_info = slack_request("users.info", token, {"user": dm_user_id})
-                        if user_info.get("ok"):
-                            name = user_info["user"].get("real_name",
-                                   user_info["user"].get("name", dm_user_id))
-                        else:
-                            name = dm_user_id
+    user_map = None  # users.list só é buscado se algum DM precisar de nome
+
+    for ch_type, channels, _ in list_all_conversations(token):
+        for ch in channels:
+            name = ch.get("name")
+            if not name:
+                # DM: resolver nome do usuário
+                dm_user_id = ch.get("user", "")
+                if dm_user_id and user_map is None:
+                    user_map = cached_user_map(token)
+                if dm_user_id and dm_user_id in user_map:
+                    name = user_map[dm_user_id]
+                elif dm_user_id:
+                    user_info = cached_users_info(token, dm_user_id)
+                    if user_info:
+                        name = user_info.get("real_name", user_info.get("name", dm_user_id))
                     else:
-                        name = ch["id"]
+                        name = dm_user_id
+                else:
+                    name = ch["id"]
 
-                conversations.append({
-                    "id": ch["id"],
-                    "name": name,
-                    "type": type_labels.get(ch_type, ch_type),
-                })
+            conversations.append({
+                "id": ch["id"],
+                "name": name,
+                "type": type_labels.get(ch_type, ch_type),
+            })
 
-            cursor = result.get("response_metadata", {}).get("next_cursor")
-            if not cursor:
-                break
-
-    return jsonify({"conversations": conversations})
+    return _json({"conversations": conversations})
 
 
 # ─── API: Iniciar Purge ──────────────────────────────────────────────────────
@@ -349,7 +887,7 @@ def api_purge():
         
         # Se tem mais de 1 mês, criar batch de jobs
         if len(chunks) > 1:
-            batch_id = uuid4().hex[:8]
+            batch_id = new_job_id()
             job_ids = []
             
             for chunk in chunks:
@@ -357,7 +895,7 @@ def api_purge():
                 oldest = date_to_ts(chunk["start"])
                 latest = date_to_ts(chunk["end"], end_of_day=True)
                 
-                purge_jobs[job_id] = {
+                purge_jobs.add(job_id, {
                     "status": "pending",
                     "progress": 0,
                     "total_conversations": 0,
@@ -366,12 +904,12 @@ def api_purge():
                     "messages_deleted": 0,
                     "errors": 0,
                     "dry_run": dry_run,
-                    "log": [],
+                    "log": deque(maxlen=LOG_MAX_ENTRIES),
                     "started_at": None,
                     "label": chunk["label"],
                     "batch_id": batch_id,
                     "chunk": chunk,
-                }
+                })
                 job_ids.append(job_id)
             
             # Rodar jobs em sequência (um de cada vez para não estourar rate limit)
@@ -396,8 +934,8 @@ def api_purge():
         return jsonify({"error": "Parâmetros de data inválidos"}), 400
 
     # Criar job
-    job_id = uuid4().hex[:8]
-    purge_jobs[job_id] = {
+    job_id = new_job_id()
+    purge_jobs.add(job_id, {
         "status": "running",
         "progress": 0,
         "total_conversations": 0,
@@ -406,9 +944,9 @@ def api_purge():
         "messages_deleted": 0,
         "errors": 0,
         "dry_run": dry_run,
-        "log": [],
+        "log": deque(maxlen=LOG_MAX_ENTRIES),
         "started_at": datetime.now().isoformat(),
-    }
+    })
 
     # Rodar em background
     thread = threading.Thread(
@@ -432,8 +970,9 @@ def run_batch_purge(job_ids: list, token: str, user_id: str, dry_run: bool, filt
         oldest = date_to_ts(chunk["start"])
         latest = date_to_ts(chunk["end"], end_of_day=True)
         
-        job["status"] = "running"
-        job["started_at"] = datetime.now().isoformat()
+        with job["lock"]:
+            job["status"] = "running"
+            job["started_at"] = datetime.now().isoformat()
         add_log(job, f"🚀 Iniciando chunk {job.get('label', '')}...")
         
         # Reutiliza a lógica do run_purge
@@ -452,113 +991,155 @@ def run_purge(job_id: str, token: str, user_id: str,
 def run_purge_internal(job_id: str, token: str, user_id: str,
                        oldest: str, latest: str, dry_run: bool, filter_channels: list):
     """Executa o purge em background."""
-    job = purge_jobs[job_id]
+    job = purge_jobs.get(job_id)
 
     try:
         # 1. Buscar conversas
         add_log(job, "📡 Buscando conversas...")
         conversations = []
 
-        for ch_type in ["public_channel", "private_channel", "mpim", "im"]:
-            cursor = None
-            while True:
-                params = {"types": ch_type, "limit": 200}
-                if cursor:
-                    params["cursor"] = cursor
-                result = slack_request("conversations.list", token, params)
-                if not result.get("ok"):
-                    break
-                for ch in result.get("channels", []):
-                    conversations.append({
-                        "id": ch["id"],
-                        "name": ch.get("name") or f"DM-{ch.get('user', ch['id'])}",
-                        "type": ch_type,
-                    })
-                cursor = result.get("response_metadata", {}).get("next_cursor")
-                if not cursor:
-                    break
+        # O purge nunca usa lista vencida: pularia conversas novas
+        for ch_type, channels, error in list_all_conversations(token, job, allow_stale=False):
+            if error:
+                with job["lock"]:
+                    job["errors"] += 1
+                add_log(job, f"⚠️ Falha ao listar {ch_type} ({error}): "
+                              f"só {len(channels)} conversas desse tipo serão varridas")
+            for ch in channels:
+                conversations.append({
+                    "id": ch["id"],
+                    "name": ch.get("name") or f"DM-{ch.get('user', ch['id'])}",
+                    "type": ch_type,
+                })
 
         # Filtrar canais se especificado
         if filter_channels:
             conversations = [c for c in conversations if c["id"] in filter_channels]
 
-        job["total_conversations"] = len(conversations)
+        with job["lock"]:
+            job["total_conversations"] = len(conversations)
         add_log(job, f"📋 {len(conversations)} conversas para varrer")
         print(f"[PURGE {job_id}] {len(conversations)} conversas para processar")
 
         # 2. Varrer conversas em PARALELO (30 ao mesmo tempo!)
+        #    As deleções de cada conversa entram na fila assim que o fetch dela
+        #    termina, então fetch e delete rodam sobrepostos em vez de em fases.
         def process_conversation(conv):
             ch_id = conv["id"]
             ch_name = conv["name"]
-            messages = fetch_user_messages_api(token, ch_id, user_id, oldest, latest)
+            try:
+                messages = fetch_user_messages_api(token, ch_id, user_id, oldest, latest, job=job)
+            except Exception as e:
+                # Uma conversa com erro não pode abortar as deleções das outras
+                with job["lock"]:
+                    job["errors"] += 1
+                add_log(job, f"⚠️ {ch_name}: erro ao buscar mensagens: {e}")
+                messages = []
             return (conv, messages)
 
-        all_results = []
+        def delete_msg(channel, ts):
+            try:
+                result = slack_request("chat.delete", token, {"channel": channel, "ts": ts}, job=job)
+            except Exception:
+                return False
+            if result.get("error") == "message_not_found" and result.get("attempts", 1) > 1:
+                # Uma tentativa anterior (timeout/5xx) já tinha apagado a mensagem
+                return True
+            return result.get("ok", False)
+
+        all_results = []  # (conv, messages, futures de deleção ainda não contabilizadas)
         add_log(job, f"🔍 Varrendo {len(conversations)} conversas...")
-        with ThreadPoolExecutor(max_workers=PARALLEL_FETCH) as executor:
-            futures = {executor.submit(process_conversation, c): c for c in conversations}
-            for i, future in enumerate(as_completed(futures)):
-                job["progress"] = i + 1
-                conv, messages = future.result()
-                job["current_conversation"] = conv["name"]
-                if messages:
-                    all_results.append((conv, messages))
-                    job["messages_found"] += len(messages)
-                    add_log(job, f"📥 {conv['name']}: {len(messages)} mensagens")
-                    print(f"[FETCH {job_id}] {conv['name']}: {len(messages)} msgs")
-                # Log progresso a cada 10 conversas
-                if (i + 1) % 10 == 0:
-                    add_log(job, f"⏳ Progresso: {i + 1}/{len(conversations)} conversas varridas")
-
-        add_log(job, f"📊 Total: {job['messages_found']} mensagens em {len(all_results)} conversas")
-
-        # 3. Processar resultados
-        total_convs = len(all_results)
-        for idx, (conv, messages) in enumerate(all_results):
-            ch_id = conv["id"]
-            ch_name = conv["name"]
-            job["current_conversation"] = ch_name
-
-            add_log(job, f"{'🔍' if dry_run else '🗑️'} [{idx+1}/{total_convs}] {ch_name}: {len(messages)} mensagens")
-
+        delete_executor = ThreadPoolExecutor(max_workers=PARALLEL_DELETES)
+        try:
+            with ThreadPoolExecutor(max_workers=PARALLEL_FETCH) as executor:
+                futures = {executor.submit(process_conversation, c): c for c in conversations}
+                for i, future in enumerate(as_completed(futures)):
+                    conv, messages = future.result()
+                    with job["lock"]:
+                        job["progress"] = i + 1
+                        job["current_conversation"] = conv["name"]
+                        if messages:
+                            job["messages_found"] += len(messages)
+                    if messages:
+                        deletes = [] if dry_run else [
+                            delete_executor.submit(delete_msg, conv["id"], m["ts"]) for m in messages
+                        ]
+                        all_results.append((conv, messages, deletes))
+                        add_log(job, f"📥 {conv['name']}: {len(messages)} mensagens")
+                        print(f"[FETCH {job_id}] {conv['name']}: {len(messages)} msgs")
+                    # Log progresso a cada 10 conversas
+                    if (i + 1) % 10 == 0:
+                        add_log(job, f"⏳ Progresso: {i + 1}/{len(conversations)} conversas varridas")
+
+            add_log(job, f"📊 Total: {job['messages_found']} mensagens em {len(all_results)} conversas")
+
+            # 3. Processar resultados (as deleções já estão em andamento)
             if dry_run:
-                job["messages_deleted"] += len(messages)
-                continue
-
-            # Deletar em PARALELO
-            def delete_msg(msg, channel=ch_id):
-                ts = msg["ts"]
-                result = slack_request("chat.delete", token, {"channel": channel, "ts": ts})
-                return result.get("ok", False)
-
-            deleted = 0
-            errors = 0
-            batch_count = 0
-            with ThreadPoolExecutor(max_workers=PARALLEL_DELETES) as executor:
-                results = list(executor.map(lambda m: delete_msg(m), messages))
-                deleted = sum(1 for r in results if r)
-                errors = len(results) - deleted
-
-            job["messages_deleted"] += deleted
-            job["errors"] += errors
-            add_log(job, f"  ✅ {deleted} deletadas, ❌ {errors} erros (total: {job['messages_deleted']})")
+                # Cada conversa já foi logada no passo 2: contabilizar tudo de
+                # uma vez e mostrar só algumas mensagens de amostra
+                with job["lock"]:
+                    job["messages_deleted"] = job["messages_found"]
+                samples = itertools.islice(
+                    ((conv, msg) for conv, messages, _ in all_results for msg in messages),
+                    DRY_RUN_SAMPLES,
+                )
+                # Sem o texto: o log vai para o jobs.db e para as rotas de status
+                for conv, msg in samples:
+                    sent_at = datetime.fromtimestamp(float(msg["ts"])).strftime("%Y-%m-%d %H:%M")
+                    kind = "resposta em thread" if msg["is_thread_reply"] else "mensagem"
+                    add_log(job, f"  👀 {conv['name']}: {kind} de {sent_at} (ts {msg['ts']})")
+            else:
+                total_convs = len(all_results)
+                for idx, (conv, messages, deletes) in enumerate(all_results):
+                    ch_name = conv["name"]
+                    with job["lock"]:
+                        job["current_conversation"] = ch_name
+
+                    add_log(job, f"🗑️ [{idx+1}/{total_convs}] {ch_name}: {len(messages)} mensagens")
+
+                    results = [f.result() for f in deletes]
+                    all_results[idx] = (conv, messages, [])
+                    deleted = sum(1 for r in results if r)
+                    errors = len(results) - deleted
+
+                    with job["lock"]:
+                        job["messages_deleted"] += deleted
+                        job["errors"] += errors
+                    add_log(job, f"  ✅ {deleted} deletadas, ❌ {errors} erros (total: {job['messages_deleted']})")
+        except BaseException:
+            # Abortando: cancelar as deleções ainda na fila e contabilizar as
+            # que já rodaram, para os contadores baterem com o Slack
+            delete_executor.shutdown(wait=True, cancel_futures=True)
+            done = [f for _, _, deletes in all_results for f in deletes if not f.cancelled()]
+            deleted = sum(1 for f in done if f.exception() is None and f.result())
+            with job["lock"]:
+                job["messages_deleted"] += deleted
+                job["errors"] += len(done) - deleted
+            raise
+        finally:
+            delete_executor.shutdown()
 
         # Concluído
-        job["status"] = "completed"
+        with job["lock"]:
+            job["status"] = "completed"
         mode_label = "DRY RUN" if dry_run else "PURGE"
         add_log(job, f"✅ {mode_label} concluído: {job['messages_deleted']} mensagens "
                       f"{'encontradas' if dry_run else 'deletadas'}, {job['errors']} erros")
 
     except Exception as e:
-        job["status"] = "error"
+        with job["lock"]:
+            job["status"] = "error"
         add_log(job, f"💥 Erro fatal: {str(e)}")
 
 
 def fetch_user_messages_api(token: str, channel_id: str, user_id: str,
-                            oldest: str = None, latest: str = None) -> list:
+                            oldest: str = None, latest: str = None, job: dict = None) -> list:
     """Busca mensagens do usuário no canal + threads."""
+    # Limites numéricos para filtrar replies; as strings só vão para a API
+    oldest_f = float(oldest) if oldest else float("-inf")
+    latest_f = float(latest) if latest else float("inf")
     user_messages = []
-    thread_parents = set()
+    thread_parents = {}  # thread_ts -> metadados do pai (None se só vimos uma reply)
     seen_ts = set()
     cursor = None
 
@@ -573,46 +1154,59 @@ def fetch_user_messages_api(token: str, channel_id: str, user_id: str,
         if cursor:
             params["cursor"] = cursor
 
-        result = slack_request("conversations.history", token, params)
+        result = slack_request("conversations.history", token, params, job=job)
         if not result.get("ok"):
             return []
 
         for msg in result.get("messages", []):
             ts = msg.get("ts", "")
+            msg_thread_ts = msg.get("thread_ts")
+            is_reply = msg_thread_ts is not None and msg_thread_ts != ts
 
             if msg.get("reply_count", 0) > 0:
-                thread_parents.add(ts)
-            if msg.get("thread_ts") and msg["thread_ts"] != ts:
-                thread_parents.add(msg["thread_ts"])
-
-            if msg.get("user") == user_id and ts not in seen_ts:
-                subtype = msg.get("subtype", "")
-                if subtype in ("channel_join", "channel_leave", "channel_topic",
-                               "channel_purpose", "bot_message"):
-                    continue
-                seen_ts.add(ts)
-                user_messages.append({
-                    "ts": ts,
-                    "text": (msg.get("text") or "")[:100],
-                    "thread_ts": msg.get("thread_ts"),
-                    "is_thread_reply": (msg.get("thread_ts") is not None
-                                        and msg.get("thread_ts") != ts),
-                })
+                thread_parents[ts] = {
+                    "reply_users": msg.get("reply_users"),
+                    "reply_users_count": msg.get("reply_users_count"),
+                }
+            if msg_thread_ts and is_reply:
+                thread_parents.setdefault(msg_thread_ts, None)
+
+            if msg.get("user") != user_id or ts in seen_ts:
+                continue
+            if msg.get("subtype", "") in SKIP_SUBTYPES:
+                continue
+            text = msg.get("text") or ""
+            seen_ts.add(ts)
+            user_messages.append({
+                "ts": ts,
+                "text": text[:100],
+                "thread_ts": msg_thread_ts,
+                "is_thread_reply": is_reply,
+            })
 
         cursor = result.get("response_metadata", {}).get("next_cursor")
         if not cursor:
             break
-        time.sleep(RATE_LIMIT_FETCH)
+        if RATE_LIMIT_FETCH:
+            time.sleep(RATE_LIMIT_FETCH)
 
-    # Threads
+    # Threads: só buscar replies onde o usuário pode ter respondido
+    thread_parents = [ts for ts, meta in thread_parents.items()
+                      if thread_may_include_user(meta, user_id)]
     for thread_ts in thread_parents:
         thread_cursor = None
         while True:
             params = {"channel": channel_id, "ts": thread_ts, "limit": BATCH_SIZE}
+            # Mesma janela do history: a API não devolve replies fora dela
+            if oldest:
+                params["oldest"] = oldest
+            if latest:
+                params["latest"] = latest
+                params["inclusive"] = "true"
             if thread_cursor:
                 params["cursor"] = thread_cursor
 
-            result = slack_request("conversations.replies", token, params)
+            result = slack_request("conversations.replies", token, params, job=job)
             if not result.get("ok"):
                 break
 
@@ -622,15 +1216,14 @@ def fetch_user_messages_api(token: str, channel_id: str, user_id: str,
                     continue
                 if msg.get("user") != user_id:
                     continue
-                if oldest and float(ts) < float(oldest):
-                    continue
-                if latest and float(ts) > float(latest):
+                if not oldest_f <= float(ts) <= latest_f:
                     continue
 
+                text = msg.get("text") or ""
                 seen_ts.add(ts)
                 user_messages.append({
                     "ts": ts,
-                    "text": (msg.get("text") or "")[:100],
+                    "text": text[:100],
                     "thread_ts": thread_ts,
                     "is_thread_reply": True,
                 })
@@ -638,20 +1231,47 @@ def fetch_user_messages_api(token: str, channel_id: str, user_id: str,
             thread_cursor = result.get("response_metadata", {}).get("next_cursor")
             if not thread_cursor:
                 break
-            time.sleep(RATE_LIMIT_FETCH)
+            if RATE_LIMIT_FETCH:
+                time.sleep(RATE_LIMIT_FETCH)
 
     return user_messages
 
 
+def thread_may_include_user(meta: dict, user_id: str) -> bool:
+    """Diz se vale buscar as replies de uma thread a partir dos dados do pai."""
+    if meta is None or meta.get("reply_users") is None:
+        return True
+    reply_users = meta["reply_users"]
+    if user_id in reply_users:
+        return True
+    # reply_users traz no máximo 5 ids: só descartar se a lista estiver completa
+    reply_users_count = meta.get("reply_users_count")
+    return reply_users_count is None or reply_users_count > len(reply_users)
+
+
+# Horário formatado do último add_log: strftime só roda quando o segundo muda
+_log_clock = [0, ""]  # [segundo, "HH:MM:SS"]
+_log_clock_lock = threading.Lock()
+
+
+def _log_time() -> str:
+    now = int(time.time())
+    with _log_clock_lock:
+        if now != _log_clock[0]:
+            _log_clock[:] = [now, time.strftime("%H:%M:%S", time.localtime(now))]
+        return _log_clock[1]
+
+
 def add_log(job: dict, message: str):
     """Adiciona entrada ao log do job."""
-    job["log"].append({
-        "time": datetime.now().strftime("%H:%M:%S"),
+    entry = {
+        "time": _log_time(),
         "message": message,
-    })
-    # Manter últimas 500 entradas
-    if len(job["log"]) > 500:
-        job["log"] = job["log"][-500:]
+    }
+    with job["lock"]:
+        job["log"].append(entry)
+        purge_jobs.publish(job, entry)
+    purge_jobs.touch(job)
 
 
 # ─── API: Status do job ──────────────────────────────────────────────────────
@@ -663,7 +1283,7 @@ def api_list_jobs():
     user_id = session.get("slack_user_id", "")
     
     jobs_list = []
-    for job_id, job in purge_jobs.items():
+    for job_id, job in purge_jobs.snapshots():
         jobs_list.append({
             "job_id": job_id,
             "status": job["status"],
@@ -685,14 +1305,14 @@ def api_list_jobs():
 
 
 @app.route("/api/purge/<job_id>")
+@requires_auth
 def api_purge_status(job_id):
-    job = purge_jobs.get(job_id)
+    last_n = request.args.get("last_log", 50, type=int)
+    job = purge_jobs.snapshot(job_id, last_log=last_n)
     if not job:
         return jsonify({"error": "Job não encontrado"}), 404
 
-    last_n = request.args.get("last_log", 50, type=int)
-
-    return jsonify({
+    return _json({
         "status": job["status"],
         "progress": job["progress"],
         "total_conversations": job["total_conversations"],
@@ -702,14 +1322,52 @@ def api_purge_status(job_id):
         "errors": job["errors"],
         "dry_run": job["dry_run"],
         "label": job.get("label", ""),
-        "log": job["log"][-last_n:],
+        "log": job["log"],
+    })
+
+
+@app.route("/api/purge/<job_id>/stream")
+@requires_auth
+def api_purge_stream(job_id):
+    """Stream (Server-Sent Events) do log do job, começando pelas últimas entradas."""
+    last_n = request.args.get("last_log", 100, type=int)
+    try:
+        sub = purge_jobs.subscribe(job_id, last_n)
+    except StreamLimitReached:
+        return jsonify({"error": "Muitos streams abertos, use polling"}), 503
+    if sub is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    q, backlog = sub
+
+    def gen():
+        try:
+            for entry in backlog:
+                yield f"data: {json.dumps(entry, ensure_ascii=False)}\n\n"
+            while True:
+                try:
+                    entry = q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    job = purge_jobs.get(job_id)
+                    if job is None or job["status"] in ("completed", "error"):
+                        yield "event: end\ndata: {}\n\n"
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(entry, ensure_ascii=False)}\n\n"
+        finally:
+            purge_jobs.unsubscribe(job_id, q)
+
+    return Response(gen(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
     })
 
 
 @app.route("/api/batch/<batch_id>")
+@requires_auth
 def api_batch_status(batch_id):
     """Retorna status de todos os jobs de um batch."""
-    batch_jobs = {k: v for k, v in purge_jobs.items() if v.get("batch_id") == batch_id}
+    batch_jobs = {k: v for k, v in purge_jobs.snapshots() if v.get("batch_id") == batch_id}
     
     if not batch_jobs:
         return jsonify({"error": "Batch não encontrado"}), 404